@@ -0,0 +1,46 @@
+"""One-shot conversion of the SavedModel in model_data/ to a TensorRT FP16 engine.
+
+The engine is specific to the GPU it is built on, so run this once on the
+deployment machine:
+
+    python export_tensorrt.py
+
+Requires the `tf2onnx` package and TensorRT's `trtexec` binary on PATH.
+The resulting model_data/yolo.engine is picked up automatically by detect.py;
+when it is absent (or TensorRT is not installed) detect.py keeps using the
+Keras SavedModel as before.
+"""
+import subprocess
+
+SAVED_MODEL_DIR = "model_data/"
+ONNX_PATH = "model_data/yolo.onnx"
+ENGINE_PATH = "model_data/yolo.engine"
+
+
+def export_onnx():
+    subprocess.run([
+        "python", "-m", "tf2onnx.convert",
+        "--saved-model", SAVED_MODEL_DIR,
+        "--output", ONNX_PATH,
+        "--opset", "13",
+        # Channels-first input avoids the transpose kernels cuDNN otherwise
+        # inserts before every convolution in the NHWC graph.
+        "--inputs-as-nchw", "input_1:0",
+    ], check=True)
+
+
+def build_engine():
+    # FP16 lets the convolutions run on Tensor Cores on Volta and newer GPUs.
+    subprocess.run([
+        "trtexec",
+        f"--onnx={ONNX_PATH}",
+        "--fp16",
+        f"--saveEngine={ENGINE_PATH}",
+        "--workspace=2048",
+    ], check=True)
+
+
+if __name__ == "__main__":
+    export_onnx()
+    build_engine()
+    print(f"TensorRT engine written to {ENGINE_PATH}")
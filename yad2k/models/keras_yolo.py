@@ -87,7 +87,10 @@ def yolo_head(feats, anchors, num_classes):
     """
     num_anchors = len(anchors)
     # Reshape to batch, height, width, num_anchors, box_params.
-    anchors_tensor = K.reshape(K.variable(anchors), [1, 1, 1, num_anchors, 2])
+    # A constant rather than a variable: the anchors never change, and
+    # creating a variable here breaks when the head is traced inside a
+    # tf.function (variables may only be created on the first call).
+    anchors_tensor = K.reshape(K.constant(anchors), [1, 1, 1, num_anchors, 2])
 
     # Static implementation for fixed models.
     # TODO: Remove or add option for static implementation.